@@ -3,8 +3,12 @@ import os
 # set server mode before any internal imports
 os.environ["IS_SERVER"] = "true"
 
-from fastapi import FastAPI, Header, HTTPException, Depends
-from typing import List, Dict, Optional
+import asyncio
+import json
+
+from fastapi import FastAPI, BackgroundTasks, Header, Request, HTTPException, Depends, Query, WebSocket
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from typing import Any, List, Dict, Optional, Union
 
 app = FastAPI(title="testudot API", description="UMD Course Monitoring API")
 
@@ -15,25 +19,236 @@ async def verify_api_key(x_api_key: Optional[str] = Header(None)):
     return x_api_key
 
 
-@app.get("/api/mappings", response_model=Dict[str, List[str]], dependencies=[Depends(verify_api_key)])
+async def verify_api_key_or_query(
+    x_api_key: Optional[str] = Header(None),
+    api_key: Optional[str] = Query(None, description="For clients that can't set headers (EventSource)"),
+):
+    from src.config import settings
+    if settings.api_key and settings.api_key not in (x_api_key, api_key):
+        raise HTTPException(status_code=403, detail="Invalid or missing API Key")
+    return x_api_key or api_key
+
+
+# seconds between SSE keep-alive comments so proxies don't drop idle streams
+SSE_KEEPALIVE = 15.0
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    from src.events import close_webhooks
+    await close_webhooks()
+
+
+@app.get("/api/mappings", response_model=Dict[str, List[Union[str, Dict[str, Any]]]], dependencies=[Depends(verify_api_key)])
 async def list_mappings_api():
     """List all bundled user-course mappings."""
     from src.utils import get_mappings
     return get_mappings()
 
 
+def accepts_gzip(accept_encoding: str) -> bool:
+    # honor q-values, so "gzip;q=0" refuses gzip; an explicit gzip entry beats "*"
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.strip().lower()] = q
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def cached_json_response(request: Request, payload) -> Response:
+    """Serve a CachedPayload with ETag/304 and pre-compressed gzip."""
+    headers = {"ETag": payload.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or payload.etag in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    ):
+        return Response(status_code=304, headers=headers)
+
+    if accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(payload.gzipped, media_type="application/json", headers=headers)
+    return Response(payload.body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/state", dependencies=[Depends(verify_api_key)])
+async def get_state(request: Request):
+    """Latest known section state for every monitored course, served from memory."""
+    from src.snapshot import get_all_payload
+
+    return cached_json_response(request, get_all_payload())
+
+
+@app.get("/api/state/{course}", dependencies=[Depends(verify_api_key)])
+async def get_course_state(course: str, request: Request):
+    """Latest known section state for one course, served from memory."""
+    from src.snapshot import get_course_payload
+
+    payload = get_course_payload(course)
+    if payload is None:
+        raise HTTPException(status_code=404, detail=f"{course.upper()} is not monitored")
+    return cached_json_response(request, payload)
+
+
 @app.post("/api/monitor", dependencies=[Depends(verify_api_key)])
-async def trigger_monitor():
-    """Trigger a single monitoring cycle for all courses."""
+async def trigger_monitor(
+    background_tasks: BackgroundTasks,
+    trace: bool = Query(False, description="Record a Chrome trace of this cycle"),
+    profile: bool = Query(False, description="With trace, cProfile every parse step"),
+):
+    """Trigger a single monitoring cycle for all courses. Emails are sent after responding, or inline when traced."""
     from src.scraper import get_current_term_id
     from src.monitor import monitor_all_courses
+    from src.outbox import deliver_outbox
+    from src.tracing import trace_cycle, lane, span
 
     term_id = get_current_term_id()
-    await monitor_all_courses(term_id=term_id)
-    return {
+    async with trace_cycle(enabled=trace, profile=profile) as tracer:
+        await monitor_all_courses(term_id=term_id)
+        if trace:
+            # deliver inline so the resend/smtp spans land in the trace
+            with lane("outbox"), span("deliver_outbox"):
+                await deliver_outbox()
+    if not trace:
+        background_tasks.add_task(deliver_outbox)
+
+    result = {
         "status": "success",
         "message": f"Monitoring cycle completed for term {term_id}",
     }
+    if tracer:
+        result["trace"] = tracer.path.name
+        if tracer.profile_path:
+            result["profile"] = tracer.profile_path.name
+    return result
+
+
+@app.post("/api/deliver", dependencies=[Depends(verify_api_key)])
+async def deliver_notifications():
+    """Drain the notification outbox now."""
+    from src.outbox import deliver_outbox, count_pending
+
+    delivered = await deliver_outbox()
+    return {"status": "success", "delivered": delivered, "pending": count_pending()}
+
+
+@app.get("/api/traces/{name}", dependencies=[Depends(verify_api_key)])
+async def get_trace(name: str):
+    """Download a trace (.json) or profile (.prof) written by a traced cycle."""
+    from src.tracing import TRACE_DIR
+
+    path = TRACE_DIR / name
+    # only serve plain file names from the trace directory
+    if path.name != name or path.suffix not in (".json", ".prof") or not path.is_file():
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return FileResponse(path, filename=name)
+
+
+@app.get("/api/sections", dependencies=[Depends(verify_api_key)])
+async def query_sections(
+    course: Optional[List[str]] = Query(None, description="Course(s) to include, e.g. CMSC131"),
+    department: Optional[str] = None,
+    instructor: Optional[str] = None,
+    min_open_seats: int = 0,
+    term: Optional[str] = None,
+):
+    """Query sections from the in-memory catalog index (no scraping)."""
+    from src.catalog import get_catalog_index
+
+    index = get_catalog_index(term)
+    return index.query(
+        courses=course,
+        department=department,
+        instructor=instructor,
+        min_open_seats=min_open_seats,
+    )
+
+
+@app.post("/api/catalog/refresh", dependencies=[Depends(verify_api_key)])
+async def refresh_catalog(
+    term: Optional[str] = None,
+    department: Optional[List[str]] = Query(None),
+    max_age: Optional[float] = Query(None, description="Only re-crawl departments older than this many minutes"),
+):
+    """Crawl department listings into the catalog snapshot."""
+    from src.catalog import crawl_term
+
+    index = await crawl_term(
+        term_id=term,
+        departments=department,
+        max_age=max_age * 60 if max_age is not None else None,
+    )
+    return {
+        "status": "success",
+        "term_id": index.term_id,
+        "courses": len(index.by_course),
+        "sections": len(index.sections),
+    }
+
+
+@app.get("/api/events", dependencies=[Depends(verify_api_key_or_query)])
+async def stream_events(course: Optional[str] = Query(None, description="Only stream changes for this course")):
+    """Stream section changes as Server-Sent Events. Browsers can pass the key as ?api_key=."""
+    from src.events import subscription
+
+    async def event_stream():
+        async with subscription(course) as queue:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['change']['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/api/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    course: Optional[str] = None,
+    api_key: Optional[str] = None,
+    x_api_key: Optional[str] = Header(None),
+):
+    """Push section changes over a WebSocket. Browsers can pass the key as ?api_key=."""
+    from src.config import settings
+    from src.events import subscription
+
+    if settings.api_key and settings.api_key not in (x_api_key, api_key):
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+
+    async def forward(queue: asyncio.Queue):
+        while True:
+            await websocket.send_json(await queue.get())
+
+    async def wait_for_disconnect():
+        # clients don't send anything, we only read to notice when they leave
+        while True:
+            await websocket.receive_text()
+
+    async with subscription(course) as queue:
+        tasks = [asyncio.create_task(forward(queue)), asyncio.create_task(wait_for_disconnect())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
 
 @app.get("/api/health")
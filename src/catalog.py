@@ -0,0 +1,190 @@
+import asyncio
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+import httpx
+
+from src.scraper import get_current_term_id, get_department_ids, scrape_department_data
+from src.utils import load_catalog, save_catalog_department, console
+
+# concurrent department requests during a crawl, to stay polite to testudo
+CRAWL_CONCURRENCY = 8
+
+
+def get_department(course_name: str) -> str:
+    match = re.match(r"[A-Z]+", course_name.upper())
+    return match.group(0) if match else course_name.upper()
+
+
+class CatalogIndex:
+    """In-memory indexes over a term's sections, rebuilt per course as data arrives."""
+
+    def __init__(self, term_id: str):
+        self.term_id = term_id
+        self.crawled_at: Dict[str, float] = {}
+        # custom_course_id -> section
+        self.sections: Dict[str, dict] = {}
+        self.by_course: Dict[str, Set[str]] = {}
+        self.by_department: Dict[str, Set[str]] = {}
+        # lowercased instructor -> custom_course_ids
+        self.by_instructor: Dict[str, Set[str]] = {}
+        # custom_course_ids with at least one open seat
+        self.open_sections: Set[str] = set()
+
+    def replace_course(self, course_name: str, sections: List[dict]):
+        course_name = course_name.upper()
+        for section_key in self.by_course.pop(course_name, set()):
+            section = self.sections.pop(section_key)
+            self._unindex_instructor(section_key, section)
+            self.open_sections.discard(section_key)
+
+        department = get_department(course_name)
+        if not sections:
+            courses = self.by_department.get(department)
+            if courses is not None:
+                courses.discard(course_name)
+            return
+
+        keys = set()
+        for section in sections:
+            section_key = section["custom_course_id"]
+            keys.add(section_key)
+            self.sections[section_key] = section
+            instructor = section.get("instructor", "").lower()
+            if instructor:
+                self.by_instructor.setdefault(instructor, set()).add(section_key)
+            if section.get("open_seats", 0) > 0:
+                self.open_sections.add(section_key)
+        self.by_course[course_name] = keys
+        self.by_department.setdefault(department, set()).add(course_name)
+
+    def replace_department(self, department: str, courses: Dict[str, List[dict]], crawled_at: float):
+        department = department.upper()
+        # courses that disappeared from the listing
+        for course_name in self.by_department.get(department, set()) - set(courses):
+            self.replace_course(course_name, [])
+        for course_name, sections in courses.items():
+            self.replace_course(course_name, sections)
+        self.crawled_at[department] = crawled_at
+
+    def _unindex_instructor(self, section_key: str, section: dict):
+        instructor = section.get("instructor", "").lower()
+        keys = self.by_instructor.get(instructor)
+        if keys is not None:
+            keys.discard(section_key)
+            if not keys:
+                del self.by_instructor[instructor]
+
+    def query(
+        self,
+        courses: Optional[Iterable[str]] = None,
+        department: Optional[str] = None,
+        instructor: Optional[str] = None,
+        min_open_seats: int = 0,
+    ) -> List[dict]:
+        candidates: Optional[Set[str]] = None
+
+        def narrow(keys: Set[str]):
+            nonlocal candidates
+            candidates = set(keys) if candidates is None else candidates & keys
+
+        if courses:
+            keys = set()
+            for course_name in courses:
+                keys |= self.by_course.get(course_name.strip().upper(), set())
+            narrow(keys)
+        if department:
+            keys = set()
+            for course_name in self.by_department.get(department.upper(), set()):
+                keys |= self.by_course.get(course_name, set())
+            narrow(keys)
+        if instructor:
+            needle = instructor.lower()
+            keys = set(self.by_instructor.get(needle, set()))
+            # fall back to partial names ("kruskal" -> "clyde kruskal")
+            if not keys:
+                for name, name_keys in self.by_instructor.items():
+                    if needle in name:
+                        keys |= name_keys
+            narrow(keys)
+        if min_open_seats > 0:
+            narrow(self.open_sections)
+
+        if candidates is None:
+            candidates = set(self.sections)
+
+        results = [self.sections[k] for k in candidates]
+        if min_open_seats > 1:
+            results = [s for s in results if s.get("open_seats", 0) >= min_open_seats]
+        return sorted(results, key=lambda s: s["custom_course_id"])
+
+
+# term id -> loaded index
+_indexes: Dict[str, CatalogIndex] = {}
+
+
+def get_catalog_index(term_id: Optional[str] = None) -> CatalogIndex:
+    """Return the index for a term, loading the stored snapshot on first use."""
+    term_id = term_id or get_current_term_id()
+    index = _indexes.get(term_id)
+    if index is None:
+        index = CatalogIndex(term_id)
+        for department, entry in load_catalog(term_id).items():
+            index.replace_department(department, entry.get("courses", {}), entry.get("crawled_at", 0))
+        _indexes[term_id] = index
+    return index
+
+
+def update_catalog_course(course_name: str, sections: List[dict], term_id: Optional[str] = None):
+    """Fold a single-course scrape (e.g. from the monitor) into an already loaded index."""
+    index = _indexes.get(term_id or get_current_term_id())
+    if index is not None:
+        index.replace_course(course_name, sections)
+
+
+async def crawl_term(
+    term_id: Optional[str] = None,
+    departments: Optional[List[str]] = None,
+    max_age: Optional[float] = None,
+) -> CatalogIndex:
+    """
+    Crawl department listings into the catalog snapshot and index.
+
+    Only departments whose snapshot is older than max_age seconds are
+    re-crawled; pass max_age=None to crawl every selected department.
+    """
+    term_id = term_id or get_current_term_id()
+    index = get_catalog_index(term_id)
+
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        if not departments:
+            departments = await get_department_ids(term_id, client)
+        departments = [d.upper() for d in departments]
+
+        if max_age is not None:
+            now = time.time()
+            departments = [
+                d for d in departments if now - index.crawled_at.get(d, 0) >= max_age
+            ]
+        console.print(f"[cyan]Crawling {len(departments)} departments for term {term_id}[/cyan]")
+
+        semaphore = asyncio.Semaphore(CRAWL_CONCURRENCY)
+
+        async def crawl_department(department: str):
+            async with semaphore:
+                try:
+                    courses = await scrape_department_data(department, term_id, client)
+                except Exception as e:
+                    console.print(f"[red]Crawl failed for {department}:[/red] {e}")
+                    return
+            crawled_at = time.time()
+            save_catalog_department(term_id, department, {"crawled_at": crawled_at, "courses": courses})
+            index.replace_department(department, courses, crawled_at)
+
+        await asyncio.gather(*(crawl_department(d) for d in departments))
+
+    console.print(
+        f"[cyan]Catalog for {term_id}: {len(index.by_course)} courses, {len(index.sections)} sections[/cyan]"
+    )
+    return index
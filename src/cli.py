@@ -3,7 +3,7 @@ import asyncio
 import schedule
 import time
 import json
-from typing import Optional
+from typing import List, Optional
 from src.config import settings, PersistenceMode
 from rich.console import Console
 from src.utils import get_mappings, add_mapping, remove_mapping
@@ -21,6 +21,10 @@ def monitor(
     term: Optional[str] = typer.Option(None, "--term", "-t", help="Term ID to use"),
     no_prompt: bool = typer.Option(False, "--no-prompt", help="Skip interactive prompts"),
     once: bool = typer.Option(False, "--once", help="Run a single cycle and exit"),
+    trace: bool = typer.Option(False, "--trace", help="Write a Chrome trace file for each cycle"),
+    profile: bool = typer.Option(
+        False, "--profile", help="With --trace, also cProfile every parse step and dump .prof files"
+    ),
 ):
     """Start course monitoring (continuous by default, or once with --once)"""
     from src.scraper import get_current_term_id
@@ -39,7 +43,18 @@ def monitor(
 
     async def run_cycle():
         from src.monitor import monitor_all_courses
-        await monitor_all_courses(term_id=term_id)
+        from src.events import close_webhooks
+        from src.tracing import trace_cycle, lane, span
+        from src.outbox import deliver_outbox
+        async with trace_cycle(enabled=trace, profile=profile):
+            await monitor_all_courses(term_id=term_id)
+            if trace:
+                # deliver inline so the resend/smtp spans land in the trace;
+                # otherwise the `deliver` worker sends what the cycle queued
+                with lane("outbox"), span("deliver_outbox"):
+                    await deliver_outbox()
+        # each cycle gets its own event loop, so release the webhook client with it
+        await close_webhooks()
         
         if not once:
             next_run = schedule.next_run()
@@ -64,21 +79,130 @@ def monitor(
 
 
 @app.command()
-def add():
+def deliver(
+    interval: int = typer.Option(
+        30, "--interval", "-i", help="Seconds between outbox polls"
+    ),
+    once: bool = typer.Option(False, "--once", help="Drain the outbox once and exit"),
+):
+    """Deliver queued notifications from the outbox (run alongside `monitor`)"""
+    from src.outbox import deliver_outbox, count_pending
+
+    if once:
+        asyncio.run(deliver_outbox())
+        console.print(f"[grey50]{count_pending()} notifications still pending[/grey50]")
+        return
+
+    async def run_worker():
+        # one event loop for the worker's lifetime
+        while True:
+            await deliver_outbox()
+            await asyncio.sleep(interval)
+
+    console.print(f"[green]Delivering outbox every {interval}s[/green]")
+    asyncio.run(run_worker())
+
+
+@app.command()
+def crawl(
+    term: Optional[str] = typer.Option(None, "--term", "-t", help="Term ID to crawl"),
+    department: Optional[List[str]] = typer.Option(
+        None, "--department", "-d", help="Only crawl these departments (repeatable)"
+    ),
+    max_age: Optional[int] = typer.Option(
+        None, "--max-age", help="Only re-crawl departments older than this many minutes"
+    ),
+):
+    """Crawl department listings into the whole-term catalog snapshot"""
+    from src.catalog import crawl_term
+
+    asyncio.run(
+        crawl_term(
+            term_id=term,
+            departments=department,
+            max_age=max_age * 60 if max_age is not None else None,
+        )
+    )
+
+
+@app.command()
+def sections(
+    course: Optional[List[str]] = typer.Argument(None, help="Courses to look up"),
+    department: Optional[str] = typer.Option(None, "--department", "-d"),
+    instructor: Optional[str] = typer.Option(None, "--instructor"),
+    open_only: bool = typer.Option(False, "--open", help="Only sections with open seats"),
+    term: Optional[str] = typer.Option(None, "--term", "-t", help="Term ID to query"),
+):
+    """Query sections from the catalog snapshot (run `crawl` first)"""
+    from rich.table import Table
+    from src.catalog import get_catalog_index
+
+    results = get_catalog_index(term).query(
+        courses=course,
+        department=department,
+        instructor=instructor,
+        min_open_seats=1 if open_only else 0,
+    )
+
+    table = Table("Section", "Instructor", "Open", "Total", "Waitlist")
+    for section in results:
+        table.add_row(
+            section["custom_course_id"],
+            section["instructor"],
+            str(section["open_seats"]),
+            str(section["total_seats"]),
+            str(section["waitlist_count"]),
+        )
+    console.print(table)
+    console.print(f"[grey50]{len(results)} sections[/grey50]")
+
+
+@app.command()
+def add(
+    sections: Optional[str] = typer.Option(
+        None, "--sections", "-s", help="Only these sections (comma-separated, e.g. 0101,0102)"
+    ),
+    on: Optional[str] = typer.Option(
+        None, "--on", help="Only these change types (comma-separated): new_section, seats_changed, section_removed, opened"
+    ),
+    instructor: Optional[str] = typer.Option(None, "--instructor", help="Only sections taught by this instructor"),
+    max_waitlist: Optional[int] = typer.Option(
+        None, "--max-waitlist", help="Skip sections with a longer waitlist than this"
+    ),
+):
     """Add or update a user -> courses mapping"""
+    from src.models import CHANGE_TYPES
+
     email = typer.prompt("Email address")
     courses_str = typer.prompt("Courses (comma-separated)")
     courses = [c.strip().upper() for c in courses_str.split(",") if c.strip()]
-    add_mapping(email, courses)
+
+    filters = {}
+    if sections:
+        filters["sections"] = [s.strip() for s in sections.split(",") if s.strip()]
+    if on:
+        filters["on"] = [t.strip() for t in on.split(",") if t.strip()]
+        unknown = [t for t in filters["on"] if t not in CHANGE_TYPES]
+        if unknown:
+            console.print(f"[red]Unknown change types: {', '.join(unknown)}[/red]")
+            raise typer.Exit(code=1)
+    if instructor:
+        filters["instructor"] = instructor
+    if max_waitlist is not None:
+        filters["max_waitlist"] = max_waitlist
+
+    add_mapping(email, courses, filters or None)
 
 
 @app.command()
 def list_mappings():
     """List all user -> courses mappings"""
+    from src.subscriptions import describe_subscription
+
     mappings = get_mappings()
     console.print("[yellow]Current mappings:[/yellow]")
     for email, courses in mappings.items():
-        console.print(f"  [cyan]{email}[/cyan]: {', '.join(courses)}")
+        console.print(f"  [cyan]{email}[/cyan]: {', '.join(describe_subscription(c) for c in courses)}")
 
 
 @app.command()
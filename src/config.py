@@ -22,6 +22,10 @@ class Config:
         self.api_key = os.getenv("API_KEY")
         self.redis_url = os.getenv("REDIS_URL")
         self.redis_token = os.getenv("REDIS_TOKEN")
+        # comma-separated endpoints that receive batched change events
+        self.webhook_urls = [
+            url.strip() for url in os.getenv("WEBHOOK_URLS", "").split(",") if url.strip()
+        ]
         
         # 1. start with 'local' default
         mode_str = "local"
@@ -0,0 +1,177 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+from src.config import settings
+from src.utils import console
+
+# per-subscriber buffer. slow consumers lose their oldest events instead of
+# back-pressuring the monitor.
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# webhook batching: flush when a batch is full or the window elapses
+WEBHOOK_BATCH_SIZE = 50
+WEBHOOK_FLUSH_INTERVAL = 0.25
+WEBHOOK_MAX_RETRIES = 3
+WEBHOOK_TIMEOUT = 10.0
+
+# course name (upper) -> subscriber queues. the None key receives every course.
+_subscribers: Dict[Optional[str], Set[asyncio.Queue]] = {}
+
+_webhook_queue: Optional[asyncio.Queue] = None
+_webhook_task: Optional[asyncio.Task] = None
+_webhook_client: Optional[httpx.AsyncClient] = None
+
+
+# subscriptions
+
+def subscribe(course_name: Optional[str] = None) -> asyncio.Queue:
+    key = course_name.upper() if course_name else None
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    _subscribers.setdefault(key, set()).add(queue)
+    return queue
+
+
+def unsubscribe(queue: asyncio.Queue):
+    for key in list(_subscribers):
+        _subscribers[key].discard(queue)
+        if not _subscribers[key]:
+            del _subscribers[key]
+
+
+@asynccontextmanager
+async def subscription(course_name: Optional[str] = None):
+    queue = subscribe(course_name)
+    try:
+        yield queue
+    finally:
+        unsubscribe(queue)
+
+
+def _offer(queue: asyncio.Queue, event: dict):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # drop the oldest event so the newest state always gets through
+        queue.get_nowait()
+        queue.put_nowait(event)
+
+
+def publish_changes(course_name: str, changes: List[dict], term_id: Optional[str] = None):
+    """Fan out changes from compare_data to live subscribers and webhooks."""
+    if not changes:
+        return
+
+    course_name = course_name.upper()
+    detected_at = time.time()
+    events = [
+        {
+            "course_name": course_name,
+            "term_id": term_id,
+            "detected_at": detected_at,
+            "change": change,
+        }
+        for change in changes
+    ]
+
+    queues = _subscribers.get(course_name, set()) | _subscribers.get(None, set())
+    for queue in queues:
+        for event in events:
+            _offer(queue, event)
+
+    if settings.webhook_urls:
+        webhook_queue = _ensure_webhook_worker()
+        for event in events:
+            webhook_queue.put_nowait(event)
+
+
+# webhooks
+
+def _ensure_webhook_worker() -> asyncio.Queue:
+    global _webhook_queue, _webhook_task, _webhook_client
+    if _webhook_queue is None:
+        _webhook_queue = asyncio.Queue()
+    if _webhook_client is None:
+        # one pooled client shared by every delivery
+        _webhook_client = httpx.AsyncClient(
+            timeout=WEBHOOK_TIMEOUT,
+            headers={"User-Agent": "testudot/0.0.0"},
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+        )
+    if _webhook_task is None or _webhook_task.done():
+        _webhook_task = asyncio.create_task(_webhook_worker())
+    return _webhook_queue
+
+
+async def _webhook_worker():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _webhook_queue.get()]
+        deadline = loop.time() + WEBHOOK_FLUSH_INTERVAL
+        while len(batch) < WEBHOOK_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_webhook_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            await asyncio.gather(
+                *(_deliver_webhook(url, batch) for url in settings.webhook_urls),
+                return_exceptions=True,
+            )
+        finally:
+            for _ in batch:
+                _webhook_queue.task_done()
+
+
+async def _deliver_webhook(url: str, batch: List[dict]):
+    payload = {"events": batch}
+    for attempt in range(WEBHOOK_MAX_RETRIES + 1):
+        try:
+            response = await _webhook_client.post(url, json=payload)
+            # client errors won't get better on retry
+            if response.status_code < 500 and response.status_code != 429:
+                if response.is_error:
+                    console.print(
+                        f"[red]Webhook {url} rejected {len(batch)} events:[/red] {response.status_code}"
+                    )
+                return
+            error = f"HTTP {response.status_code}"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+        if attempt < WEBHOOK_MAX_RETRIES:
+            await asyncio.sleep(0.5 * 2**attempt)
+
+    console.print(
+        f"[red]Webhook delivery to {url} failed after {WEBHOOK_MAX_RETRIES + 1} attempts:[/red] {error}"
+    )
+
+
+async def flush_webhooks():
+    """Wait until every queued webhook event has been delivered (or given up on)."""
+    if _webhook_queue is not None and _webhook_task is not None and not _webhook_task.done():
+        await _webhook_queue.join()
+
+
+async def close_webhooks():
+    """Flush pending webhooks, then stop the worker and release the pooled client."""
+    global _webhook_queue, _webhook_task, _webhook_client
+    await flush_webhooks()
+    if _webhook_task is not None:
+        _webhook_task.cancel()
+        try:
+            await _webhook_task
+        except asyncio.CancelledError:
+            pass
+    if _webhook_client is not None:
+        await _webhook_client.aclose()
+    _webhook_queue = None
+    _webhook_task = None
+    _webhook_client = None
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 
 
 class ClassTime(BaseModel):
@@ -20,3 +20,34 @@ class CourseSection(BaseModel):
     custom_course_id: str
     last_updated: Optional[datetime] = None
     removed: bool = False
+
+
+# change types produced by compare_data, plus "opened" for sections whose
+# open seats go from 0 to more than 0 (or that appear with open seats)
+CHANGE_TYPES = ("new_section", "seats_changed", "section_removed", "opened")
+
+
+class Subscription(BaseModel):
+    email: str
+    course: str
+    # None means every section of the course
+    sections: Optional[List[str]] = None
+    on: List[str] = ["new_section", "seats_changed", "section_removed"]
+    # case-insensitive substring of the instructor name
+    instructor: Optional[str] = None
+    # skip sections whose waitlist is longer than this
+    max_waitlist: Optional[int] = None
+
+    @validator("course")
+    def normalize_course(cls, v):
+        return v.strip().upper()
+
+    @validator("sections")
+    def normalize_sections(cls, v):
+        return [s.strip() for s in v] if v else None
+
+    @validator("on", each_item=True)
+    def check_change_type(cls, v):
+        if v not in CHANGE_TYPES:
+            raise ValueError(f"unknown change type {v!r}, expected one of {', '.join(CHANGE_TYPES)}")
+        return v
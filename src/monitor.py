@@ -1,8 +1,12 @@
 import asyncio
 from typing import List, Any, Optional
 from src.scraper import scrape_course_data
-from src.notifier import send_notification
-from src.utils import load_sections_state, save_sections_state, get_mappings, console
+from src.outbox import commit_changes
+from src.events import publish_changes
+from src.catalog import update_catalog_course
+from src.snapshot import update_course_state
+from src.tracing import span, lane
+from src.utils import load_sections_state, save_sections_state, get_mappings, get_mapped_courses, console
 from src.models import CourseSection
 
 
@@ -33,6 +37,7 @@ def compare_data(existing_data: List[dict], new_data: List[dict]) -> List[dict]:
                     "from": existing_section.get("open_seats"),
                     "to": new_section["open_seats"],
                     "instructor": new_section["instructor"],
+                    "waitlist_count": new_section.get("waitlist_count", 0),
                 }
             )
 
@@ -50,6 +55,7 @@ def compare_data(existing_data: List[dict], new_data: List[dict]) -> List[dict]:
                     "type": "section_removed",
                     "sectionId": existing_section["section_id"],
                     "custom_course_id": existing_section.get("custom_course_id"),
+                    "instructor": existing_section.get("instructor", ""),
                 }
             )
 
@@ -58,21 +64,40 @@ def compare_data(existing_data: List[dict], new_data: List[dict]) -> List[dict]:
 
 
 async def monitor_course(course_name: str, term_id: Optional[str] = None):
+    with lane(course_name), span("monitor_course", cat="course", course=course_name):
+        await _monitor_course(course_name, term_id=term_id)
+
+
+async def _monitor_course(course_name: str, term_id: Optional[str] = None):
     console.print(f"[magenta]Monitoring course: {course_name}[/magenta]")
     try:
-        existing_data = load_sections_state(course_name)
+        with span("load_state"):
+            existing_data = load_sections_state(course_name)
         scraped_data = await scrape_course_data(course_name, term_id=term_id)
 
-        changes = compare_data(existing_data, scraped_data)
+        with span("diff"):
+            changes = compare_data(existing_data, scraped_data)
 
         if changes:
-            await send_notification(changes, course_name)
+            # push to live subscribers right away, email goes through the outbox
+            publish_changes(course_name, changes, term_id=term_id)
 
         # update state (mark removed sections)
         # for simplicity, we just save the latest scraped data as the new state.
         # if we wanted to keep removed sections in state, we'd need more complex logic.
         # the ts version upserted each section. here we replace the whole course file.
-        save_sections_state(course_name, scraped_data)
+        with span("save_state", changes=len(changes)):
+            if changes:
+                # state and the outbox entry commit together, so a crash can
+                # neither lose the changes nor email them twice
+                if not commit_changes(course_name, scraped_data, changes, existing_data):
+                    console.print(
+                        f"[grey50]{course_name} was already committed by an overlapping cycle[/grey50]"
+                    )
+            else:
+                save_sections_state(course_name, scraped_data)
+        update_course_state(course_name, scraped_data)
+        update_catalog_course(course_name, scraped_data, term_id=term_id)
 
         console.print(f"[magenta]Completed monitoring for {course_name}[/magenta]")
     except Exception as e:
@@ -80,10 +105,7 @@ async def monitor_course(course_name: str, term_id: Optional[str] = None):
 
 
 async def monitor_all_courses(term_id: Optional[str] = None):
-    mappings = get_mappings()
-    all_courses = list(
-        set([course for courses in mappings.values() for course in courses])
-    )
+    all_courses = get_mapped_courses(get_mappings())
     if not all_courses:
         console.print("[yellow]No courses to monitor.[/yellow]")
         return
@@ -2,17 +2,9 @@ import os
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import List, Dict
-from src.utils import get_mappings, console
-
-
-def get_emails_for_course(course_name: str) -> List[str]:
-    mappings = get_mappings()
-    emails = []
-    for email, courses in mappings.items():
-        if course_name in courses:
-            emails.append(email)
-    return emails
+from typing import List, Dict, Optional, Tuple
+from src.utils import console, get_loop_lock
+from src.tracing import span
 
 
 def generate_email_body(changes: List[dict], course_name: str) -> str:
@@ -94,13 +86,13 @@ def generate_email_body(changes: List[dict], course_name: str) -> str:
     </html>"""
 
 
-async def send_smtp_notification(changes: List[dict], course_name: str, recipients: List[str]):
+async def send_smtp_notification(changes: List[dict], course_name: str, recipients: List[str]) -> bool:
     email_user = os.getenv("EMAIL_USER")
     email_pass = os.getenv("EMAIL_PASS")
 
     if not email_user or not email_pass:
         console.print("[yellow]EMAIL_USER or EMAIL_PASS not set. Skipping SMTP.[/yellow]")
-        return
+        return False
 
     from email.mime.text import MIMEText
     from email.mime.multipart import MIMEMultipart
@@ -113,21 +105,27 @@ async def send_smtp_notification(changes: List[dict], course_name: str, recipien
     msg.attach(MIMEText(body, "html"))
 
     try:
-        with smtplib.SMTP("smtp.gmail.com", 587, timeout=30) as server:
+        with span("smtp.send", cat="blocking"), smtplib.SMTP("smtp.gmail.com", 587, timeout=30) as server:
             server.starttls()
             server.login(email_user, email_pass)
             server.send_message(msg)
         console.print(f"[green]SMTP Notification sent for {course_name}[/green]")
+        return True
     except Exception as e:
         console.print(f"[red]Failed to send SMTP notification for {course_name}:[/red] {e}")
+        return False
 
 
 import asyncio
 
-# global lock to respect resend's 2 req/sec rate limit
-_resend_lock = asyncio.Lock()
 
-async def send_resend_notification(changes: List[dict], course_name: str, recipients: List[str], api_key: str):
+async def send_resend_notification(
+    changes: List[dict],
+    course_name: str,
+    recipients: List[str],
+    api_key: str,
+    idempotency_key: Optional[str] = None,
+):
     import resend
     
     resend.api_key = api_key
@@ -143,9 +141,15 @@ async def send_resend_notification(changes: List[dict], course_name: str, recipi
         "html": body
     }
     
-    async with _resend_lock:
+    # one send at a time to respect resend's 2 req/sec rate limit
+    async with get_loop_lock("resend"):
         try:
-            resend.Emails.send(params)
+            with span("resend.send", cat="blocking"):
+                if idempotency_key:
+                    # lets resend drop a retry of an email it already accepted
+                    resend.Emails.send(params, {"idempotency_key": idempotency_key})
+                else:
+                    resend.Emails.send(params)
             console.print(f"[green]Resend Notification sent for {course_name}[/green]")
         except Exception as e:
             console.print(f"[red]Failed to send Resend notification for {course_name}:[/red] {e}")
@@ -154,22 +158,47 @@ async def send_resend_notification(changes: List[dict], course_name: str, recipi
             # always sleep for 0.5s after a Resend attempt to respect rate limits. we have 2 req/sec limit 
             await asyncio.sleep(0.5)
 
-async def send_notification(changes: List[dict], course_name: str):
-    console.print(f"[green]Sending notification for {course_name}[/green]")
+def plan_notifications(changes: List[dict], course_name: str) -> List[Tuple[List[str], List[dict]]]:
+    """Match changes against subscriptions. Returns (recipients, changes) pairs, one per email."""
+    from src.subscriptions import get_subscription_index
 
-    recipients = get_emails_for_course(course_name)
-    if not recipients:
+    # recipients who matched exactly the same changes share one email
+    groups: Dict[tuple, List[str]] = {}
+    for email, matched in get_subscription_index().changes_by_recipient(course_name, changes).items():
+        groups.setdefault(tuple(id(c) for c in matched), []).append(email)
+    if not groups:
         console.print(
-            f"[grey50]No recipients for {course_name}, skipping email.[/grey50]"
+            f"[grey50]No matching subscribers for {course_name}, skipping email.[/grey50]"
         )
-        return
 
+    changes_by_id = {id(c): c for c in changes}
+    return [
+        (sorted(recipients), [changes_by_id[i] for i in change_ids])
+        for change_ids, recipients in groups.items()
+    ]
+
+
+async def send_email(
+    changes: List[dict],
+    course_name: str,
+    recipients: List[str],
+    idempotency_key: Optional[str] = None,
+) -> bool:
+    """Send one email. Returns False if it should be retried."""
+    console.print(f"[green]Sending notification for {course_name} to {len(recipients)} recipients[/green]")
     resend_api_key = os.getenv("RESEND_TOKEN")
     if resend_api_key:
         try:
-            await send_resend_notification(changes, course_name, recipients, resend_api_key)
+            await send_resend_notification(
+                changes, course_name, recipients, resend_api_key, idempotency_key
+            )
+            return True
         except Exception:
             console.print("[yellow]Falling back to SMTP notification.[/yellow]")
-            await send_smtp_notification(changes, course_name, recipients)
+            return await send_smtp_notification(changes, course_name, recipients)
+    elif not os.getenv("EMAIL_USER") or not os.getenv("EMAIL_PASS"):
+        # nothing is configured, so retrying can't help
+        console.print("[yellow]No email provider configured. Skipping notification.[/yellow]")
+        return True
     else:
-        await send_smtp_notification(changes, course_name, recipients)
+        return await send_smtp_notification(changes, course_name, recipients)
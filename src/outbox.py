@@ -0,0 +1,364 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from src.config import settings, PersistenceMode
+from src.notifier import plan_notifications, send_email
+from src.utils import get_db, get_loop_lock, get_redis_client, get_state_key, get_revision_key, upsert_sections_state, console
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 8
+# retry delay in seconds, doubled for every failed attempt
+OUTBOX_RETRY_BASE = 30
+# how long a claimed entry stays invisible to other workers
+OUTBOX_LEASE = 300
+
+# redis: entries by id, a sorted set of ids scored by next attempt time, and
+# entries that ran out of attempts
+REDIS_ENTRIES_KEY = "testudot:outbox:entries"
+REDIS_DUE_KEY = "testudot:outbox:due"
+REDIS_DEAD_KEY = "testudot:outbox:dead"
+
+# select due ids and push their score past the lease in one atomic step, so
+# two workers (e.g. the deliver CLI and the API) can never claim the same entry
+REDIS_CLAIM_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, id in ipairs(ids) do
+    redis.call('ZADD', KEYS[1], ARGV[3], id)
+end
+return ids
+"""
+
+# commit only if the stored state is still the one that was diffed, then bump the
+# course revision and enqueue under it. the entry is stored without its id, which
+# only exists once the revision is known; claim_entries_redis fills it back in.
+REDIS_COMMIT_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and current ~= ARGV[1] then
+    return false
+end
+local id = ARGV[3] .. ':' .. redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[2])
+redis.call('HSET', KEYS[3], id, ARGV[4])
+redis.call('ZADD', KEYS[4], ARGV[5], id)
+return id
+"""
+
+
+def make_entry(course_name: str, changes: List[dict]) -> dict:
+    # the id is set on commit: course name plus the revision the commit creates,
+    # so every state transition gets its own entry even if its changes repeat
+    return {
+        "course_name": course_name.upper(),
+        "changes": changes,
+        "created_at": time.time(),
+        "attempts": 0,
+        # group keys (see _group_key) already sent, so a retry skips them
+        "delivered": [],
+    }
+
+
+# persistence functions: local
+
+OUTBOX_COLUMNS = (
+    "id TEXT PRIMARY KEY, course_name TEXT NOT NULL, changes TEXT NOT NULL, "
+    "created_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+    "next_attempt_at REAL NOT NULL, last_error TEXT, delivered TEXT"
+)
+
+
+def _ensure_outbox_table(conn: sqlite3.Connection):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS outbox ({OUTBOX_COLUMNS})")
+    # entries that ran out of attempts, kept out of the outbox id space
+    conn.execute(f"CREATE TABLE IF NOT EXISTS outbox_dead ({OUTBOX_COLUMNS})")
+
+
+def _row_to_entry(row) -> dict:
+    return {
+        "id": row[0],
+        "course_name": row[1],
+        "changes": json.loads(row[2]),
+        "created_at": row[3],
+        "attempts": row[4],
+        "delivered": json.loads(row[5]) if row[5] else [],
+    }
+
+
+def commit_changes_local(course_name: str, sections: List[dict], entry: dict, previous_state: List[dict]) -> bool:
+    conn = get_db()
+    try:
+        with conn:
+            _ensure_outbox_table(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT sections, revision FROM sections_state WHERE course_name = ?",
+                (course_name.upper(),),
+            ).fetchone()
+            if row and json.loads(row[0]) != previous_state:
+                return False
+            entry["id"] = f"{course_name.upper()}:{row[1] + 1 if row else 1}"
+            upsert_sections_state(conn, course_name, sections)
+            conn.execute(
+                "INSERT INTO outbox (id, course_name, changes, created_at, attempts, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, 0, ?)",
+                (entry["id"], entry["course_name"], json.dumps(entry["changes"]), entry["created_at"], entry["created_at"]),
+            )
+        return True
+    finally:
+        conn.close()
+
+
+def claim_entries_local(limit: int) -> List[dict]:
+    now = time.time()
+    conn = get_db()
+    try:
+        with conn:
+            _ensure_outbox_table(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, course_name, changes, created_at, attempts, delivered FROM outbox "
+                "WHERE next_attempt_at <= ? AND attempts < ? ORDER BY created_at LIMIT ?",
+                (now, OUTBOX_MAX_ATTEMPTS, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                [(now + OUTBOX_LEASE, row[0]) for row in rows],
+            )
+    finally:
+        conn.close()
+    return [_row_to_entry(row) for row in rows]
+
+
+def ack_entries_local(entries: List[dict]):
+    conn = get_db()
+    try:
+        with conn:
+            conn.executemany("DELETE FROM outbox WHERE id = ?", [(e["id"],) for e in entries])
+    finally:
+        conn.close()
+
+
+def fail_entries_local(entries: List[dict], error: str):
+    conn = get_db()
+    try:
+        with conn:
+            _ensure_outbox_table(conn)
+            conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?, delivered = ? WHERE id = ?",
+                [(_next_attempt_at(e), error, json.dumps(e.get("delivered", [])), e["id"]) for e in entries],
+            )
+            # entries that reach OUTBOX_MAX_ATTEMPTS move to the dead letter table
+            conn.execute(
+                "INSERT OR REPLACE INTO outbox_dead SELECT * FROM outbox WHERE attempts >= ?",
+                (OUTBOX_MAX_ATTEMPTS,),
+            )
+            conn.execute("DELETE FROM outbox WHERE attempts >= ?", (OUTBOX_MAX_ATTEMPTS,))
+    finally:
+        conn.close()
+
+
+def count_pending_local() -> int:
+    conn = get_db()
+    try:
+        _ensure_outbox_table(conn)
+        return conn.execute(
+            "SELECT COUNT(*) FROM outbox WHERE attempts < ?", (OUTBOX_MAX_ATTEMPTS,)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+# persistence functions: redis
+
+def commit_changes_redis(course_name: str, sections: List[dict], entry: dict, previous_state: List[dict]) -> bool:
+    client = get_redis_client()
+    if not client:
+        return False
+    entry_id = client.eval(
+        REDIS_COMMIT_SCRIPT,
+        keys=[get_state_key(course_name), get_revision_key(course_name), REDIS_ENTRIES_KEY, REDIS_DUE_KEY],
+        args=[json.dumps(previous_state), json.dumps(sections), course_name.upper(), json.dumps(entry), str(entry["created_at"])],
+    )
+    if not entry_id:
+        return False
+    entry["id"] = entry_id
+    return True
+
+
+def claim_entries_redis(limit: int) -> List[dict]:
+    client = get_redis_client()
+    if not client:
+        return []
+    now = time.time()
+    ids = client.eval(
+        REDIS_CLAIM_SCRIPT,
+        keys=[REDIS_DUE_KEY],
+        args=[str(now), str(limit), str(now + OUTBOX_LEASE)],
+    )
+    if not ids:
+        return []
+    entries = []
+    orphans = []
+    for entry_id, raw in zip(ids, client.hmget(REDIS_ENTRIES_KEY, *ids)):
+        if raw:
+            entry = json.loads(raw) if isinstance(raw, str) else raw
+            entry["id"] = entry_id
+            entries.append(entry)
+        else:
+            orphans.append(entry_id)
+    if orphans:
+        client.zrem(REDIS_DUE_KEY, *orphans)
+    return entries
+
+
+def ack_entries_redis(entries: List[dict]):
+    client = get_redis_client()
+    if not client:
+        return
+    ids = [e["id"] for e in entries]
+    tx = client.multi()
+    tx.hdel(REDIS_ENTRIES_KEY, *ids)
+    tx.zrem(REDIS_DUE_KEY, *ids)
+    tx.exec()
+
+
+def fail_entries_redis(entries: List[dict], error: str):
+    client = get_redis_client()
+    if not client:
+        return
+    tx = client.multi()
+    for entry in entries:
+        next_attempt_at = _next_attempt_at(entry)
+        entry = {**entry, "attempts": entry["attempts"] + 1, "last_error": error}
+        if entry["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+            tx.hset(REDIS_DEAD_KEY, entry["id"], json.dumps(entry))
+            tx.hdel(REDIS_ENTRIES_KEY, entry["id"])
+            tx.zrem(REDIS_DUE_KEY, entry["id"])
+        else:
+            tx.hset(REDIS_ENTRIES_KEY, entry["id"], json.dumps(entry))
+            tx.zadd(REDIS_DUE_KEY, {entry["id"]: next_attempt_at})
+    tx.exec()
+
+
+def count_pending_redis() -> int:
+    client = get_redis_client()
+    if not client:
+        return 0
+    return client.zcard(REDIS_DUE_KEY)
+
+
+# unified dispatcher
+
+def commit_changes(course_name: str, sections: List[dict], changes: List[dict], previous_state: List[dict]) -> bool:
+    """
+    Save the new section state and enqueue its notification in one transaction.
+
+    Returns False without writing anything if the stored state is no longer
+    previous_state, i.e. an overlapping cycle already committed this course.
+    """
+    entry = make_entry(course_name, changes)
+    if settings.persistence_mode == PersistenceMode.REDIS:
+        return commit_changes_redis(course_name, sections, entry, previous_state)
+    return commit_changes_local(course_name, sections, entry, previous_state)
+
+
+def claim_entries(limit: int) -> List[dict]:
+    if settings.persistence_mode == PersistenceMode.REDIS:
+        return claim_entries_redis(limit)
+    return claim_entries_local(limit)
+
+
+def ack_entries(entries: List[dict]):
+    if settings.persistence_mode == PersistenceMode.REDIS:
+        ack_entries_redis(entries)
+    else:
+        ack_entries_local(entries)
+
+
+def fail_entries(entries: List[dict], error: str):
+    if settings.persistence_mode == PersistenceMode.REDIS:
+        fail_entries_redis(entries, error)
+    else:
+        fail_entries_local(entries, error)
+
+
+def count_pending() -> int:
+    if settings.persistence_mode == PersistenceMode.REDIS:
+        return count_pending_redis()
+    return count_pending_local()
+
+
+def _next_attempt_at(entry: dict) -> float:
+    return time.time() + OUTBOX_RETRY_BASE * 2 ** entry["attempts"]
+
+
+# delivery worker
+
+def _group_key(entry: dict, recipients: List[str]) -> str:
+    # stable per entry and recipient set, whatever else was claimed alongside
+    # it, so retries skip it and the provider can drop duplicates
+    return hashlib.sha256(
+        f"{entry['id']}@{entry['created_at']}:{','.join(sorted(recipients))}".encode()
+    ).hexdigest()
+
+
+async def _deliver_entry(entry: dict) -> Optional[str]:
+    """Send every email an entry still owes. Returns an error if any send failed."""
+    delivered = set(entry.get("delivered", []))
+    error = None
+    for recipients, changes in plan_notifications(entry["changes"], entry["course_name"]):
+        key = _group_key(entry, recipients)
+        if key in delivered:
+            continue
+        try:
+            if await send_email(changes, entry["course_name"], recipients, idempotency_key=key):
+                delivered.add(key)
+                continue
+            error = error or "delivery failed"
+        except Exception as e:
+            error = error or str(e) or type(e).__name__
+    entry["delivered"] = sorted(delivered)
+    return error
+
+
+async def _deliver_course(entries: List[dict]) -> int:
+    delivered = []
+    # oldest first so subscribers see a course's changes in order
+    for entry in sorted(entries, key=lambda e: e["created_at"]):
+        error = await _deliver_entry(entry)
+        if error is None:
+            delivered.append(entry)
+        else:
+            fail_entries([entry], error)
+    if delivered:
+        ack_entries(delivered)
+    return len(delivered)
+
+
+async def deliver_outbox(batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """Drain due outbox entries. Returns entries delivered."""
+    delivered = 0
+    # one drain at a time per process; other processes are kept out by the lease
+    async with get_loop_lock("deliver_outbox"):
+        while True:
+            entries = claim_entries(batch_size)
+            if not entries:
+                break
+
+            by_course: Dict[str, List[dict]] = {}
+            for entry in entries:
+                by_course.setdefault(entry["course_name"], []).append(entry)
+
+            results = await asyncio.gather(
+                *(_deliver_course(course_entries) for course_entries in by_course.values())
+            )
+            delivered += sum(results)
+            if len(entries) < batch_size:
+                break
+
+    if delivered:
+        console.print(f"[green]Outbox: delivered {delivered} notifications[/green]")
+    return delivered
@@ -1,8 +1,9 @@
 import httpx
 from datetime import datetime
-from bs4 import BeautifulSoup
-from typing import List, Optional
+from bs4 import BeautifulSoup, Tag
+from typing import Dict, List, Optional
 from src.utils import console
+from src.tracing import span, profiled
 from src.models import CourseSection, ClassTime
 
 
@@ -28,6 +29,22 @@ def get_current_term_id() -> str:
         return f"{year}08"
 
 
+def build_search_url(course_id: str, term_id: str) -> str:
+    # course_id can be a full course (CMSC131) or a department prefix (CMSC)
+    return f"https://app.testudo.umd.edu/soc/search?courseId={course_id}&sectionId=&termId={term_id}&creditCompare=&credits=&courseLevelFilter=ALL&instructor=&_facetoface=on&_blended=on&_online=on&courseStartCompare=&courseStartHour=&courseStartMin=&courseStartAM=&courseEndHour=&courseEndMin=&courseEndAM=&teachingCenter=ALL&_classDay1=on&_classDay2=on&_classDay3=on&_classDay4=on&_classDay5=on"
+
+
+async def fetch_testudo_html(url: str, client: Optional[httpx.AsyncClient] = None) -> str:
+    if client is None:
+        async with httpx.AsyncClient() as client:
+            return await fetch_testudo_html(url, client)
+
+    response = await client.get(url, headers={"User-Agent": "testudot/0.0.0"})
+    response.raise_for_status()
+    console.print(f"[blue]Received response: {response.status_code}[/blue]")
+    return response.text
+
+
 async def get_testudo_course_html(
     course_name: str, term_id: Optional[str] = None
 ) -> str:
@@ -35,23 +52,28 @@ async def get_testudo_course_html(
         term_id = get_current_term_id()
 
     console.print(f"[blue]Fetching HTML for {course_name} (Term: {term_id})[/blue]")
-    url = f"https://app.testudo.umd.edu/soc/search?courseId={course_name}&sectionId=&termId={term_id}&creditCompare=&credits=&courseLevelFilter=ALL&instructor=&_facetoface=on&_blended=on&_online=on&courseStartCompare=&courseStartHour=&courseStartMin=&courseStartAM=&courseEndHour=&courseEndMin=&courseEndAM=&teachingCenter=ALL&_classDay1=on&_classDay2=on&_classDay3=on&_classDay4=on&_classDay5=on"
-
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers={"User-Agent": "testudot/0.0.0"})
-        response.raise_for_status()
-        console.print(f"[blue]Received response: {response.status_code}[/blue]")
-        return response.text
+    return await fetch_testudo_html(build_search_url(course_name, term_id))
 
 
 async def scrape_course_data(
     course_name: str, term_id: Optional[str] = None
 ) -> List[dict]:
     console.print(f"[green]Scraping data for {course_name}[/green]")
-    html = await get_testudo_course_html(course_name, term_id)
-    soup = BeautifulSoup(html, "html.parser")
+    with span("fetch", course=course_name):
+        html = await get_testudo_course_html(course_name, term_id)
+
+    with span("parse", course=course_name, bytes=len(html)), profiled("parse"):
+        soup = BeautifulSoup(html, "html.parser")
+        sections_data = parse_sections(soup, course_name)
 
-    sections_elements = soup.select(".section")
+    console.print(
+        f"[green]Found {len(sections_data)} sections for {course_name}[/green]"
+    )
+    return sections_data
+
+
+def parse_sections(root: Tag, course_name: str) -> List[dict]:
+    sections_elements = root.select(".section")
     sections_data = []
 
     for section in sections_elements:
@@ -115,7 +137,53 @@ async def scrape_course_data(
             }
         )
 
+    return sections_data
+
+
+async def get_department_ids(
+    term_id: Optional[str] = None, client: Optional[httpx.AsyncClient] = None
+) -> List[str]:
+    if not term_id:
+        term_id = get_current_term_id()
+
+    console.print(f"[blue]Fetching department list (Term: {term_id})[/blue]")
+    html = await fetch_testudo_html(f"https://app.testudo.umd.edu/soc/{term_id}", client)
+    soup = BeautifulSoup(html, "html.parser")
+
+    departments = []
+    for prefix_el in soup.select(".course-prefix .prefix-abbrev"):
+        prefix = prefix_el.get_text(strip=True).upper()
+        if prefix and prefix not in departments:
+            departments.append(prefix)
+    return departments
+
+
+async def scrape_department_data(
+    department: str,
+    term_id: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None,
+) -> Dict[str, List[dict]]:
+    """Scrape every course in a department with a single search request."""
+    if not term_id:
+        term_id = get_current_term_id()
+
+    console.print(f"[green]Scraping department {department} (Term: {term_id})[/green]")
+    with span("fetch", department=department):
+        html = await fetch_testudo_html(build_search_url(department, term_id), client)
+
+    courses = {}
+    with span("parse", department=department, bytes=len(html)), profiled("parse"):
+        soup = BeautifulSoup(html, "html.parser")
+        for course_el in soup.select(".course"):
+            course_name = course_el.get("id") or ""
+            if not course_name:
+                cid_el = course_el.select_one(".course-id")
+                course_name = cid_el.get_text(strip=True) if cid_el else ""
+            if not course_name:
+                continue
+            courses[course_name.upper()] = parse_sections(course_el, course_name.upper())
+
     console.print(
-        f"[green]Found {len(sections_data)} sections for {course_name}[/green]"
+        f"[green]Found {len(courses)} courses in {department}[/green]"
     )
-    return sections_data
+    return courses
@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.utils import get_mappings, get_mapped_courses, load_sections_state
+
+
+class CachedPayload:
+    """A JSON response body serialized once, with its ETag and (lazily) gzipped form."""
+
+    def __init__(self, data):
+        self.body = json.dumps(data, separators=(",", ":")).encode()
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self._gzipped: Optional[bytes] = None
+
+    @property
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+
+# course (upper) -> {"course_name", "updated_at", "sections"}. updated_at is None
+# for courses read through from persistence rather than set by a monitor cycle.
+_states: Dict[str, dict] = {}
+_course_payloads: Dict[str, CachedPayload] = {}
+_all_payload: Optional[Tuple[tuple, CachedPayload]] = None
+_version = 0
+
+_mapped_courses: Optional[Tuple[dict, Tuple[str, ...]]] = None
+
+
+def get_cached_courses() -> Tuple[str, ...]:
+    global _mapped_courses
+    mappings = get_mappings()
+    if _mapped_courses is None or _mapped_courses[0] is not mappings:
+        courses = tuple(sorted(get_mapped_courses(mappings)))
+        _mapped_courses = (mappings, courses)
+        # drop courses that are no longer mapped so they stop being served
+        for course_name in set(_states) - set(courses):
+            del _states[course_name]
+        for course_name in set(_course_payloads) - set(courses):
+            del _course_payloads[course_name]
+    return _mapped_courses[1]
+
+
+def update_course_state(course_name: str, sections: List[dict]):
+    """Called by the monitor once a course's new state is committed."""
+    global _version
+    course_name = course_name.upper()
+    state = _states.get(course_name)
+    if state is not None and state["sections"] == sections:
+        # nothing moved, so keep updated_at and the ETags pollers already have
+        return
+    _states[course_name] = {
+        "course_name": course_name,
+        "updated_at": time.time(),
+        "sections": sections,
+    }
+    _course_payloads.pop(course_name, None)
+    _version += 1
+
+
+def _get_state(course_name: str) -> dict:
+    state = _states.get(course_name)
+    if state is None:
+        # read through to redis/sqlite the first time a course is asked for
+        state = {
+            "course_name": course_name,
+            "updated_at": None,
+            "sections": load_sections_state(course_name),
+        }
+        _states[course_name] = state
+    return state
+
+
+def get_course_payload(course_name: str) -> Optional[CachedPayload]:
+    """Return the cached state for a course, or None if it isn't monitored."""
+    course_name = course_name.upper()
+    if course_name not in get_cached_courses():
+        return None
+    payload = _course_payloads.get(course_name)
+    if payload is None:
+        payload = CachedPayload(_get_state(course_name))
+        _course_payloads[course_name] = payload
+    return payload
+
+
+def get_all_payload() -> CachedPayload:
+    """Return the cached state of every monitored course."""
+    global _all_payload
+    courses = get_cached_courses()
+    key = (_version, courses)
+    if _all_payload is None or _all_payload[0] != key:
+        _all_payload = (
+            key,
+            CachedPayload({"courses": {course: _get_state(course) for course in courses}}),
+        )
+    return _all_payload[1]
@@ -0,0 +1,116 @@
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from pydantic import ValidationError
+
+from src.models import Subscription
+from src.utils import get_mappings, console
+
+
+def parse_subscriptions(mappings: Dict[str, List[Union[str, dict]]]) -> List[Subscription]:
+    """
+    Turn user-course-map.json entries into subscriptions.
+
+    A plain course string subscribes to every change in that course. An object
+    narrows it down, e.g. {"course": "CMSC131", "sections": ["0101"], "on": ["opened"]}.
+    """
+    subscriptions = []
+    for email, entries in mappings.items():
+        for entry in entries:
+            try:
+                if isinstance(entry, str):
+                    subscriptions.append(Subscription(email=email, course=entry))
+                else:
+                    subscriptions.append(Subscription(email=email, **entry))
+            except (ValidationError, TypeError) as e:
+                console.print(f"[red]Skipping invalid subscription for {email}:[/red] {entry} ({e})")
+    return subscriptions
+
+
+def get_change_section(change: dict) -> str:
+    if change["type"] == "new_section":
+        return change["data"]["section_id"]
+    return change["sectionId"]
+
+
+def get_change_types(change: dict) -> List[str]:
+    types = [change["type"]]
+    if change["type"] == "new_section" and change["data"].get("open_seats", 0) > 0:
+        types.append("opened")
+    elif change["type"] == "seats_changed" and not change.get("from") and change["to"] > 0:
+        types.append("opened")
+    return types
+
+
+def _passes_filters(subscription: Subscription, change: dict) -> bool:
+    details = change["data"] if change["type"] == "new_section" else change
+    if subscription.instructor:
+        if subscription.instructor.lower() not in details.get("instructor", "").lower():
+            return False
+    if subscription.max_waitlist is not None and change["type"] != "section_removed":
+        if details.get("waitlist_count", 0) > subscription.max_waitlist:
+            return False
+    return True
+
+
+class SubscriptionIndex:
+    """Subscriptions keyed by (course, section, change type); None matches any section."""
+
+    def __init__(self, subscriptions: List[Subscription]):
+        self.courses: Set[str] = set()
+        self._index: Dict[Tuple[str, Optional[str], str], List[Subscription]] = {}
+        for subscription in subscriptions:
+            self.courses.add(subscription.course)
+            for change_type in set(subscription.on):
+                for section in subscription.sections or [None]:
+                    self._index.setdefault(
+                        (subscription.course, section, change_type), []
+                    ).append(subscription)
+
+    def match(self, course_name: str, change: dict) -> List[Subscription]:
+        course_name = course_name.upper()
+        section = get_change_section(change)
+        matched = []
+        seen = set()
+        for change_type in get_change_types(change):
+            for key in ((course_name, section, change_type), (course_name, None, change_type)):
+                for subscription in self._index.get(key, []):
+                    # a subscription can be reached through both "opened" and "seats_changed"
+                    if id(subscription) not in seen and _passes_filters(subscription, change):
+                        seen.add(id(subscription))
+                        matched.append(subscription)
+        return matched
+
+    def changes_by_recipient(self, course_name: str, changes: List[dict]) -> Dict[str, List[dict]]:
+        recipients: Dict[str, List[dict]] = {}
+        for change in changes:
+            for email in {s.email for s in self.match(course_name, change)}:
+                recipients.setdefault(email, []).append(change)
+        return recipients
+
+
+_index_cache: Optional[Tuple[dict, SubscriptionIndex]] = None
+
+
+def get_subscription_index() -> SubscriptionIndex:
+    """Compile the current mappings, reusing the last index while they are unchanged."""
+    global _index_cache
+    mappings = get_mappings()
+    # get_mappings hands back the same dict until the file changes
+    if _index_cache is None or _index_cache[0] is not mappings:
+        _index_cache = (mappings, SubscriptionIndex(parse_subscriptions(mappings)))
+    return _index_cache[1]
+
+
+def describe_subscription(entry: Union[str, dict]) -> str:
+    if isinstance(entry, str):
+        return entry
+    parts = [entry.get("course", "?").upper()]
+    if entry.get("sections"):
+        parts.append(f"[{', '.join(entry['sections'])}]")
+    if entry.get("on"):
+        parts.append(f"on {'/'.join(entry['on'])}")
+    if entry.get("instructor"):
+        parts.append(f"instructor ~ {entry['instructor']}")
+    if entry.get("max_waitlist") is not None:
+        parts.append(f"waitlist <= {entry['max_waitlist']}")
+    return " ".join(parts)
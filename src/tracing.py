@@ -0,0 +1,209 @@
+import asyncio
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.utils import console
+
+PROJECT_ROOT = Path(__file__).parent.parent
+TRACE_DIR = PROJECT_ROOT / "traces"
+
+# how often the loop-lag probe wakes up, and how late it has to be before
+# we draw an explicit "event loop blocked" span
+LAG_PROBE_INTERVAL = 0.05
+LAG_BLOCKED_THRESHOLD = 0.01
+
+# cProfile one in every N parse steps; profiling all of them skews the trace
+PROFILE_SAMPLE_EVERY = 10
+PROFILE_TOP_FUNCTIONS = 10
+
+_current_tracer: contextvars.ContextVar[Optional["Tracer"]] = contextvars.ContextVar(
+    "testudot_tracer", default=None
+)
+_current_lane: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "testudot_trace_lane", default=0
+)
+
+
+class Tracer:
+    """Collects Chrome trace events (chrome://tracing, Perfetto) for one cycle."""
+
+    def __init__(self, name: str, dump_profile: bool = False):
+        self.name = name
+        self.dump_profile = dump_profile
+        self.events: List[dict] = []
+        self.path: Optional[Path] = None
+        self.profile_path: Optional[Path] = None
+        self._pid = os.getpid()
+        self._t0 = time.perf_counter()
+        self._lanes: Dict[str, int] = {}
+        self._parse_count = 0
+        self._stats: Optional[pstats.Stats] = None
+        self.lane_id("cycle")
+        self.lane_id("event loop")
+
+    def now_us(self) -> float:
+        return (time.perf_counter() - self._t0) * 1e6
+
+    def lane_id(self, name: str) -> int:
+        # one trace "thread" per course so overlapping coroutines get their own row
+        if name not in self._lanes:
+            tid = len(self._lanes)
+            self._lanes[name] = tid
+            self.events.append(
+                {"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}}
+            )
+        return self._lanes[name]
+
+    def complete(self, name: str, cat: str, start_us: float, dur_us: float, tid: int, args: Optional[dict] = None):
+        self.events.append(
+            {
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": start_us,
+                "dur": dur_us,
+                "pid": self._pid,
+                "tid": tid,
+                "args": args or {},
+            }
+        )
+
+    def instant(self, name: str, cat: str, tid: int, args: Optional[dict] = None):
+        self.events.append(
+            {"name": name, "cat": cat, "ph": "i", "s": "t", "ts": self.now_us(), "pid": self._pid, "tid": tid, "args": args or {}}
+        )
+
+    def counter(self, name: str, values: Dict[str, float]):
+        self.events.append(
+            {"name": name, "ph": "C", "ts": self.now_us(), "pid": self._pid, "args": values}
+        )
+
+    def should_profile(self) -> bool:
+        self._parse_count += 1
+        return self.dump_profile or (self._parse_count - 1) % PROFILE_SAMPLE_EVERY == 0
+
+    def add_profile(self, name: str, profiler: cProfile.Profile):
+        stats = pstats.Stats(profiler)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        self.instant(
+            f"{name} profile",
+            "profile",
+            _current_lane.get(),
+            {
+                f"{func} ({os.path.basename(filename)}:{line})": round(cumtime * 1000, 3)
+                for (filename, line, func), (_, _, _, cumtime, _) in top[:PROFILE_TOP_FUNCTIONS]
+            },
+        )
+        if self.dump_profile:
+            if self._stats is None:
+                self._stats = stats
+            else:
+                self._stats.add(stats)
+
+    def write(self, directory: Optional[Path] = None) -> Path:
+        directory = directory or TRACE_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.path = directory / f"{self.name}-{stamp}.json"
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+        if self._stats is not None:
+            self.profile_path = directory / f"{self.name}-{stamp}.prof"
+            self._stats.dump_stats(self.profile_path)
+        return self.path
+
+
+# instrumentation helpers. all of these are no-ops unless a cycle is being traced.
+
+@contextmanager
+def span(name: str, cat: str = "phase", **args):
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield
+        return
+    start = tracer.now_us()
+    try:
+        yield
+    finally:
+        tracer.complete(name, cat, start, tracer.now_us() - start, _current_lane.get(), args)
+
+
+@contextmanager
+def lane(name: str):
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield
+        return
+    token = _current_lane.set(tracer.lane_id(name))
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+@contextmanager
+def profiled(name: str):
+    """cProfile a synchronous block. Never wrap code that awaits."""
+    tracer = _current_tracer.get()
+    if tracer is None or not tracer.should_profile():
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        tracer.add_profile(name, profiler)
+
+
+async def _probe_loop_lag(tracer: Tracer):
+    loop = asyncio.get_running_loop()
+    tid = tracer.lane_id("event loop")
+    while True:
+        expected = loop.time() + LAG_PROBE_INTERVAL
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        lag = max(loop.time() - expected, 0.0)
+        tracer.counter("event loop lag (ms)", {"lag": round(lag * 1000, 3)})
+        if lag >= LAG_BLOCKED_THRESHOLD:
+            now = tracer.now_us()
+            tracer.complete("event loop blocked", "loop", now - lag * 1e6, lag * 1e6, tid)
+
+
+@asynccontextmanager
+async def trace_cycle(enabled: bool = True, profile: bool = False, name: str = "cycle"):
+    """
+    Trace everything awaited inside the block and write a Chrome trace file.
+
+    Yields the Tracer (or None when disabled). With profile=True every parse
+    step is profiled and the merged stats are dumped next to the trace.
+    """
+    if not enabled:
+        yield None
+        return
+
+    tracer = Tracer(name, dump_profile=profile)
+    token = _current_tracer.set(tracer)
+    probe = asyncio.create_task(_probe_loop_lag(tracer))
+    try:
+        with span(name, cat="cycle"):
+            yield tracer
+    finally:
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+        _current_tracer.reset(token)
+        tracer.write()
+        console.print(f"[grey50]Trace written to {tracer.path}[/grey50]")
+        if tracer.profile_path:
+            console.print(f"[grey50]Parse profile written to {tracer.profile_path}[/grey50]")
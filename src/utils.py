@@ -1,8 +1,12 @@
+import asyncio
+import copy
 import json
+import weakref
 import os
 import re
+import sqlite3
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 from src.config import settings, PersistenceMode
 
 from rich.console import Console
@@ -27,19 +31,60 @@ def get_redis_client():
             console.print(f"[yellow]Failed to initialize Upstash Redis: {e}[/yellow]")
     return _redis_client
 
+# asyncio locks are bound to the loop they are first contended on, and the cli
+# runs a fresh loop per cycle, so shared locks are kept per running loop
+_loop_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Lock]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_loop_lock(name: str) -> asyncio.Lock:
+    locks = _loop_locks.setdefault(asyncio.get_running_loop(), {})
+    if name not in locks:
+        locks[name] = asyncio.Lock()
+    return locks[name]
+
+
 # mapping functions
-def get_mappings() -> Dict[str, List[str]]:
-    if not MAPPINGS_FILE.exists():
+
+# parsed mappings keyed by file mtime. callers get the shared dict back, so
+# anything that edits mappings must copy it first (see add_mapping).
+_mappings_cache: Optional[Tuple[int, Dict[str, List[Union[str, dict]]]]] = None
+
+
+def get_mappings() -> Dict[str, List[Union[str, dict]]]:
+    global _mappings_cache
+    try:
+        mtime = MAPPINGS_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
         return {}
+    if _mappings_cache is not None and _mappings_cache[0] == mtime:
+        return _mappings_cache[1]
     try:
         with open(MAPPINGS_FILE, "r") as f:
-            return json.load(f)
+            mappings = json.load(f)
     except Exception as e:
         console.print(f"[red]Failed to read mappings:[/red] {e}")
         return {}
+    _mappings_cache = (mtime, mappings)
+    return mappings
 
 
-def save_mappings(mappings: Dict[str, List[str]]):
+def get_mapped_courses(mappings: Dict[str, List[Union[str, dict]]]) -> List[str]:
+    # entries are either a course name or a subscription object with a "course" key
+    courses = []
+    for entries in mappings.values():
+        for entry in entries:
+            course = entry if isinstance(entry, str) else entry.get("course")
+            if course and course.upper() not in courses:
+                courses.append(course.upper())
+    return courses
+
+
+def save_mappings(mappings: Dict[str, List[Union[str, dict]]]):
+    global _mappings_cache
+    # mtimes can be too coarse to notice two quick writes
+    _mappings_cache = None
     try:
         with open(MAPPINGS_FILE, "w") as f:
             json.dump(mappings, f, indent=2)
@@ -49,21 +94,23 @@ def save_mappings(mappings: Dict[str, List[str]]):
         )
 
 
-def add_mapping(email: str, courses: List[str]):
-    mappings = get_mappings()
+def add_mapping(email: str, courses: List[str], filters: Optional[dict] = None):
+    mappings = copy.deepcopy(get_mappings())
     if email not in mappings:
         mappings[email] = []
 
     for course in courses:
         course = course.strip().upper()
-        if course not in mappings[email]:
-            mappings[email].append(course)
+        # filters (sections, on, instructor, max_waitlist) turn the entry into a subscription object
+        entry = {"course": course, **filters} if filters else course
+        if entry not in mappings[email]:
+            mappings[email].append(entry)
     save_mappings(mappings)
     console.print(f"[blue]Saved mapping: {email} -> {', '.join(courses)}[/blue]")
 
 
 def remove_mapping(email: str):
-    mappings = get_mappings()
+    mappings = copy.deepcopy(get_mappings())
     if email in mappings:
         del mappings[email]
         save_mappings(mappings)
@@ -74,11 +121,20 @@ def remove_mapping(email: str):
 
 # persistence functions: redis
 
+def get_state_key(course_name: str) -> str:
+    return f"testudot:state:{course_name.upper()}"
+
+
+def get_revision_key(course_name: str) -> str:
+    # bumped every time a course's changes are committed (see src/outbox.py)
+    return f"testudot:revision:{course_name.upper()}"
+
+
 def load_sections_state_redis(course_name: str) -> List[dict]:
     client = get_redis_client()
     if not client:
         return []
-    key = f"testudot:state:{course_name.upper()}"
+    key = get_state_key(course_name)
     try:
         data = client.get(key)
         if data:
@@ -93,7 +149,7 @@ def load_sections_state_redis(course_name: str) -> List[dict]:
 def save_sections_state_redis(course_name: str, sections: List[dict]):
     client = get_redis_client()
     if client:
-        key = f"testudot:state:{course_name.upper()}"
+        key = get_state_key(course_name)
         try:
             client.set(key, json.dumps(sections))
         except Exception as e:
@@ -101,6 +157,33 @@ def save_sections_state_redis(course_name: str, sections: List[dict]):
 
 
 # persistence functions: local
+# section state lives in sqlite so it can be committed in the same transaction
+# as outbox entries (see src/outbox.py). the per-course json files are only read
+# as a fallback for state written by older versions.
+
+def get_db() -> sqlite3.Connection:
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(STATE_DIR / "testudot.db", timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sections_state (course_name TEXT PRIMARY KEY, sections TEXT NOT NULL, "
+        "revision INTEGER NOT NULL DEFAULT 0)"
+    )
+    # databases created before revisions existed
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(sections_state)")}
+    if "revision" not in columns:
+        conn.execute("ALTER TABLE sections_state ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+    return conn
+
+
+def upsert_sections_state(conn: sqlite3.Connection, course_name: str, sections: List[dict]):
+    # every write bumps the course's revision, so each state transition is distinct
+    conn.execute(
+        "INSERT INTO sections_state (course_name, sections, revision) VALUES (?, ?, 1) "
+        "ON CONFLICT(course_name) DO UPDATE SET sections = excluded.sections, revision = revision + 1",
+        (course_name.upper(), json.dumps(sections)),
+    )
+
 
 def get_state_file(course_name: str) -> Optional[Path]:
     try:
@@ -111,6 +194,21 @@ def get_state_file(course_name: str) -> Optional[Path]:
         return None
 
 def load_sections_state_local(course_name: str) -> List[dict]:
+    try:
+        conn = get_db()
+        try:
+            row = conn.execute(
+                "SELECT sections FROM sections_state WHERE course_name = ?",
+                (course_name.upper(),),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row:
+            return json.loads(row[0])
+    except Exception as e:
+        console.print(f"[yellow]Local state load failed for {course_name}: {e}[/yellow]")
+        return []
+
     state_file = get_state_file(course_name)
     if not state_file or not state_file.exists():
         return []
@@ -121,13 +219,15 @@ def load_sections_state_local(course_name: str) -> List[dict]:
         return []
 
 def save_sections_state_local(course_name: str, sections: List[dict]):
-    state_file = get_state_file(course_name)
-    if state_file:
+    try:
+        conn = get_db()
         try:
-            with open(state_file, "w") as f:
-                json.dump(sections, f, indent=2)
-        except Exception:
-            pass
+            with conn:
+                upsert_sections_state(conn, course_name, sections)
+        finally:
+            conn.close()
+    except Exception as e:
+        console.print(f"[yellow]Local state save failed for {course_name}: {e}[/yellow]")
 
 
 # unified dispatcher
@@ -142,3 +242,78 @@ def save_sections_state(course_name: str, sections: List[dict]):
         save_sections_state_redis(course_name, sections)
     else:
         save_sections_state_local(course_name, sections)
+
+
+# catalog snapshots: one entry per department so refreshes only rewrite what changed.
+# each entry is {"crawled_at": <epoch seconds>, "courses": {course: [sections]}}
+
+def load_catalog_redis(term_id: str) -> Dict[str, dict]:
+    client = get_redis_client()
+    if not client:
+        return {}
+    key = f"testudot:catalog:{term_id}"
+    try:
+        data = client.hgetall(key) or {}
+        return {
+            dept: json.loads(entry) if isinstance(entry, str) else entry
+            for dept, entry in data.items()
+        }
+    except Exception as e:
+        console.print(f"[yellow]Redis catalog load failed for {term_id}: {e}[/yellow]")
+    return {}
+
+
+def save_catalog_department_redis(term_id: str, department: str, entry: dict):
+    client = get_redis_client()
+    if client:
+        key = f"testudot:catalog:{term_id}"
+        try:
+            client.hset(key, department, json.dumps(entry))
+        except Exception as e:
+            console.print(f"[yellow]Redis catalog save failed for {department}: {e}[/yellow]")
+
+
+def get_catalog_dir(term_id: str) -> Optional[Path]:
+    try:
+        catalog_dir = STATE_DIR / f"catalog-{term_id}"
+        catalog_dir.mkdir(parents=True, exist_ok=True)
+        return catalog_dir
+    except Exception:
+        return None
+
+
+def load_catalog_local(term_id: str) -> Dict[str, dict]:
+    catalog_dir = get_catalog_dir(term_id)
+    if not catalog_dir:
+        return {}
+    catalog = {}
+    for dept_file in catalog_dir.glob("*.json"):
+        try:
+            with open(dept_file, "r") as f:
+                catalog[dept_file.stem] = json.load(f)
+        except Exception:
+            continue
+    return catalog
+
+
+def save_catalog_department_local(term_id: str, department: str, entry: dict):
+    catalog_dir = get_catalog_dir(term_id)
+    if catalog_dir:
+        try:
+            with open(catalog_dir / f"{department.upper()}.json", "w") as f:
+                json.dump(entry, f)
+        except Exception:
+            pass
+
+
+def load_catalog(term_id: str) -> Dict[str, dict]:
+    if settings.persistence_mode == PersistenceMode.REDIS:
+        return load_catalog_redis(term_id)
+    return load_catalog_local(term_id)
+
+
+def save_catalog_department(term_id: str, department: str, entry: dict):
+    if settings.persistence_mode == PersistenceMode.REDIS:
+        save_catalog_department_redis(term_id, department, entry)
+    else:
+        save_catalog_department_local(term_id, department, entry)